@@ -4,24 +4,48 @@ Syllabification de mots en français.
 
 __author__ = "Heuron Patapon"
 __email__ = "heuron-patapon@laposte.net"
-__version__ = "1.1.2"
+__version__ = "1.2.0"
 
 import re
 import unittest
 import doctest
 import functools
+from collections import deque
+from typing import Iterable, NamedTuple
 
 
 import hpat.ezre as ezre
 from hpat.xsampa import XSAMPA
 
+try:  # optional, faster regex engine:
+    import re2
+except ImportError:
+    re2 = None
+
 
 def load_tests(loader, tests, ignore):
     tests.addTests(doctest.DocTestSuite(__name__))
+    tests.addTests(doctest.DocTestSuite(f"{__name__}.__main__"))
     return tests
 
 
-class Syllable:
+def _syllable_structure(*, V, C, S, Y, LC):
+    return (
+        # it seems easier to reverse the word for the syllabification:
+        C[:].group("coda")  # any coda without particular rule
+        + V.group("nucleus")
+        + (
+            # semivowel:
+            Y[:1]
+            # onset:
+            + (ezre.Ezre.from_str("ng") | LC | C)[:1]
+            # extrasyllabic element:
+            + (S[:1] + None | S[:1:min])
+        ).group("onset")
+    )
+
+
+class Syllable(NamedTuple):
     LIQUIDS = ["ʁ", "l"]
     GLIDES = ["j", "w", "ɥ"]
     VOWELS = [
@@ -48,6 +72,15 @@ class Syllable:
         "ŋ", "ʼ", "tʃ", "dʒ",
     ]
 
+    is_complex = lambda x: len(x) != 1
+    COMPLEX_SOUNDS = sorted(set(
+        filter(is_complex, LIQUIDS + GLIDES + VOWELS + CONSONANTS)))
+    complex_sound = r"|".join(COMPLEX_SOUNDS)
+    # single private use characters encoding complex sounds:
+    codes = {
+        sound: chr(0xE000 + i) for i, sound in enumerate(COMPLEX_SOUNDS)
+    }
+
     V = ezre.Ezre.from_sequence(VOWELS, label="A")
     S = ezre.Ezre.from_sequence(["s"], label="S")
     L = ezre.Ezre.from_sequence(LIQUIDS, label="L")
@@ -56,55 +89,39 @@ class Syllable:
     # beware: we work on reversed syllables:
     LC = (L + ezre.Ezre.from_sequence(LIQUID_FRIENDLY)).as_("LC")
 
-    structure = (
-        # it seems easier to reverse the word for the syllabification:
-        C[:].group("coda")  # any coda without particular rule
-        + V.group("nucleus")
-        + (
-            # semivowel:
-            Y[:1]
-            # onset:
-            + (ezre.Ezre.from_str("ng") | LC | C)[:1]
-            # extrasyllabic element:
-            + (S[:1] + None | S[:1:min])
-        ).group("onset")
-    )
+    structure = _syllable_structure(V=V, C=C, S=S, Y=Y, LC=LC)
 
     pattern = structure.compiled
-    is_complex = lambda x: len(x) != 1
-    complex_sound = r"|".join(set(
-        filter(is_complex, LIQUIDS + GLIDES + VOWELS + CONSONANTS)))
-
-    __slots__ = ("onset", "nucleus", "coda")
 
-    def __init__(self, onset, nucleus, coda):
-        self.onset = onset
-        self.nucleus = nucleus
-        self.coda = coda
+    onset: str
+    nucleus: str
+    coda: str
 
     @property
     def ipa(self):
         return str(self)
 
     def __str__(self):
-        return "".join((self.onset, self.nucleus, self.coda))
+        return "".join(self)
 
     def __repr__(self):
-        return repr((self.onset, self.nucleus, self.coda))
+        return tuple.__repr__(self)
 
 
 class Syllabification:
-    __slots__ = ("syllables", )
+    __slots__ = ("syllables", "_str")
 
     def __init__(self, *syllables):
         self.syllables = syllables
+        self._str = ".".join([onset + nucleus + coda
+                              for onset, nucleus, coda in syllables])
 
     @property
     def ipa(self):
         return str(self)
 
     def __str__(self):
-        return ".".join(map(str, self.syllables))
+        return self._str
 
     def __repr__(self):
         return repr(self.syllables)
@@ -119,6 +136,76 @@ class Syllabification:
         return self.syllables[key]
 
 
+def _fast_compiled(pattern: re.Pattern) -> re.Pattern:
+    """
+    Recompile the pattern with `re2` when it is available and supports it. 
+    """
+    if re2 is None or pattern.flags & ~re.UNICODE:
+        return pattern
+    try:
+        return re2.compile(pattern.pattern)
+    except re2.error:
+        return pattern
+
+
+# `Syllable.pattern` works on IPA, the hot path works on words where each 
+# complex sound is encoded as a single private use character:
+_PATTERN = _syllable_structure(
+    V=ezre.Ezre.from_sequence(
+        list(map(Syllable.codes.get, Syllable.VOWELS, Syllable.VOWELS)),
+        label="A"),
+    C=(Syllable.L | Syllable.Y | ezre.Ezre.from_sequence(
+        list(map(Syllable.codes.get, Syllable.CONSONANTS,
+                 Syllable.CONSONANTS)))).as_("C"),
+    S=Syllable.S,
+    Y=Syllable.Y,
+    LC=Syllable.LC,
+).compiled
+_FINDITER = _fast_compiled(_PATTERN).finditer
+_COMPLEX_SOUNDS = tuple(Syllable.COMPLEX_SOUNDS)
+_MIRRORED_SOUNDS = tuple((sound[::-1], sound) for sound in _COMPLEX_SOUNDS)
+# second character of each complex sound (mostly combining marks):
+_COMPLEX_MARKS = frozenset(sound[1] for sound in _COMPLEX_SOUNDS)
+_CODES = tuple(Syllable.codes.items())
+_DECODING = str.maketrans({code: sound for sound, code in _CODES})
+
+
+def _has_complex_sound(word: str) -> bool:
+    # a single pass over the word rules out most of them:
+    if _COMPLEX_MARKS.isdisjoint(word):
+        return False
+    return any(map(word.__contains__, _COMPLEX_SOUNDS))
+
+
+def _encoded(word: str) -> str:
+    for sound, code in _CODES:
+        word = word.replace(sound, code)
+    return word
+
+
+def _groups(match: re.Match, word: str, end: int, encoded: bool) -> Syllable:
+    """
+    Onset, nucleus and coda of a match found in the reversed `word`. 
+
+    Once complex sounds are encoded, the word is plainly reversed: a group 
+    spanning [start, stop) in it is `word[end - stop:end - start]`, where 
+    `end` is the length of the word. 
+    """
+    match_span = match.span
+    start, stop = match_span("onset")
+    onset = word[end - stop:end - start]
+    start, stop = match_span("nucleus")
+    nucleus = word[end - stop:end - start]
+    start, stop = match_span("coda")
+    coda = word[end - stop:end - start]
+    if encoded:
+        onset = onset.translate(_DECODING)
+        nucleus = nucleus.translate(_DECODING)
+        coda = coda.translate(_DECODING)
+    # same as `Syllable(onset, nucleus, coda)`, without the Python-level call:
+    return tuple.__new__(Syllable, (onset, nucleus, coda))
+
+
 @functools.cache
 def mirrored(word: str) -> str:
     """
@@ -129,16 +216,32 @@ def mirrored(word: str) -> str:
     ~~~python
     >>> mirrored("kalkyləʁjɔ̃")
     'ɔ̃jʁəlyklak'
+    >>> mirrored("kadavʁ")
+    'ʁvadak'
+    >>> Syllable.pattern.match(mirrored("kɑ̃")).group("nucleus")
+    'ɑ̃'
 
     ~~~
     """
-    return re.sub(Syllable.complex_sound, lambda m: m.group()[::-1], word)[::-1]
-
-
+    # most words have no complex sound, skip the regex for them:
+    if not _has_complex_sound(word):
+        return word[::-1]
+    # complex sounds are fixed literals, put them back in order in the 
+    # reversed word with plain substring replacements:
+    result = word[::-1]
+    for mirrored_sound, sound in _MIRRORED_SOUNDS:
+        result = result.replace(mirrored_sound, sound)
+    return result
+
+
+@functools.lru_cache(maxsize=65536)
 def syllabify(word: str) -> Syllabification:
     """
     Break a word pronunciation written in IPA into syllables. 
 
+    Results are cached: the same `Syllabification` instance is returned 
+    for repeated words, it must not be modified. 
+
     Examples
     --------
     ~~~python
@@ -146,6 +249,10 @@ def syllabify(word: str) -> Syllabification:
     (('', 'a', 'ʁbʁ'),)
     >>> syllabify("kadavʁ")
     (('k', 'a', ''), ('d', 'a', 'vʁ'))
+    >>> str(syllabify("kadavʁ"))
+    'ka.davʁ'
+    >>> syllabify("kadavʁ")[-1].coda
+    'vʁ'
     >>> syllabify("kalkyləʁjɔ̃")
     (('k', 'a', 'l'), ('k', 'y', ''), ('l', 'ə', ''), ('ʁj', 'ɔ̃', ''))
     >>> syllabify("kɑ̃bʁje")
@@ -212,23 +319,91 @@ def syllabify(word: str) -> Syllabification:
     (('', 'a', ''), ('gn', 'ɔ', 's'), ('t', 'i', 'k'))
     >>> syllabify(XSAMPA.to_ipa("sHivR@"))
     (('sɥ', 'i', ''), ('vʁ', 'ə', ''))
+    >>> syllabify("aʃte")  # 'ʃt' is not the affricate 'tʃ'
+    (('', 'a', 'ʃ'), ('t', 'e', ''))
+    >>> syllabify("tʃɛk")
+    (('tʃ', 'ɛ', 'k'),)
+    >>> syllabify("udʒʁe")  # affricates are kept whole, before a liquid too
+    (('', 'u', 'dʒ'), ('ʁ', 'e', ''))
+    >>> syllabify("utʃʁe")
+    (('', 'u', 'tʃ'), ('ʁ', 'e', ''))
 
     # TODO: psy, psaume, see issue #2
 
     ~~~
     """
     # initialization:
-    syllables = list()
-    syllables_append = syllables.append
+    syllables = deque()
+    syllables_appendleft = syllables.appendleft
+    encoded = _has_complex_sound(word)
+    if encoded:
+        word = _encoded(word)
+    end = len(word)
     # actual work:
-    for match in re.finditer(Syllable.pattern, mirrored(word)):
-        match_group = match.group
-        onset = mirrored(match_group("onset"))
-        nucleus = mirrored(match_group("nucleus"))
-        coda = mirrored(match_group("coda"))
-        syllables_append(Syllable(onset, nucleus, coda))
-    return Syllabification(*reversed(syllables))
+    for match in _FINDITER(word[::-1]):
+        syllables_appendleft(_groups(match, word, end, encoded))
+    return Syllabification(*syllables)
+
+
+def syllabify_many(words: Iterable[str]) -> list[Syllabification]:
+    """
+    Break several word pronunciations written in IPA into syllables. 
+
+    Each word goes through the cached `syllabify`, so repeated words share 
+    the same `Syllabification` instance, which must not be modified. 
+
+    Examples
+    --------
+    ~~~python
+    >>> syllabify_many(["kadavʁ", "", "aʁbʁ"])
+    [(('k', 'a', ''), ('d', 'a', 'vʁ')), (), (('', 'a', 'ʁbʁ'),)]
+    >>> syllabify_many(["tʃɛk", "kadavʁ", "ɑ̃fɑ̃"])
+    [(('tʃ', 'ɛ', 'k'),), (('k', 'a', ''), ('d', 'a', 'vʁ')), (('', 'ɑ̃', ''), ('f', 'ɑ̃', ''))]
+    >>> [str(s) for s in syllabify_many(["stʁiktəmɑ̃", "kadavʁ", "spɔʁ"])]
+    ['stʁik.tə.mɑ̃', 'ka.davʁ', 'spɔʁ']
+    >>> words = ["spɔʁ", "stʁiktəmɑ̃", "distʁibɥe", "ɛ̃stʁyksjɔ̃", "spɔʁ"]
+    >>> syllabify_many(words) == list(map(syllabify, words))
+    True
+    >>> first, _, second = syllabify_many(["la", "kadavʁ", "la"])
+    >>> first is second
+    True
+
+    ~~~
+    """
+    # each word is scanned on its own: the extrasyllabic 's' of the 
+    # pattern is anchored to the end of the scanned text
+    return list(map(syllabify, words))
+
+
+@unittest.skipUnless(re2, "google-re2 is not installed")
+class Re2TestCase(unittest.TestCase):
+    """
+    `_groups` slices words with the group spans: `re2` must find the same 
+    ones as `re` (non-ASCII offsets, end anchor, lazy quantifiers). 
+    """
 
+    @staticmethod
+    def corpus():
+        docs = (syllabify.__doc__ + syllabify_many.__doc__).splitlines()
+        for line in filter(lambda line: ">>> " in line, docs):
+            for xsampa, word in re.findall(
+                    r'(XSAMPA\.to_ipa\()?"([^"]*)"', line):
+                yield XSAMPA.to_ipa(word) if xsampa else word
+
+    def test_same_spans(self):
+        fast = _fast_compiled(_PATTERN)
+        if fast is _PATTERN:
+            self.skipTest("re2 does not support the pattern")
+        groups = ("onset", "nucleus", "coda")
+        for word in self.corpus():
+            text = _encoded(word)[::-1]
+            with self.subTest(word=word):
+                self.assertEqual(
+                    [[match.span(g) for g in groups]
+                     for match in fast.finditer(text)],
+                    [[match.span(g) for g in groups]
+                     for match in _PATTERN.finditer(text)],
+                )
 
 if __name__ == '__main__':
     doctest.testmod()
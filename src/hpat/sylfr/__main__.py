@@ -1,7 +1,11 @@
+import io
 import sys
+import codecs
 import argparse
-import collections
-from itertools import islice
+import contextlib
+import functools
+import threading
+import multiprocessing
 from typing import *
 
 
@@ -9,58 +13,161 @@ import hpat.sylfr as sylfr
 from hpat.xsampa import XSAMPA
 
 
-ipa = XSAMPA.to_ipa  # alias
-xsampa = XSAMPA.from_ipa  # alias
+# aliases, cached because the same words come back again and again:
+ipa = functools.lru_cache(maxsize=65536)(XSAMPA.to_ipa)
+xsampa = functools.lru_cache(maxsize=65536)(XSAMPA.from_ipa)
+BATCH_SIZE = 1024  # lines syllabified at once when reading from a pipe
+READ_SIZE = 1 << 20  # maximum bytes read at once when reading from a pipe
 
 
-def iter_stdin():
+def iter_stdin(batch_size):
+    """
+    Iterate over batches of at most `batch_size` input lines, each batch 
+    being yielded as soon as its lines are available. 
+    """
     if sys.stdin.isatty():
         while True:
             line = input(f"[{__package__}]: ")
-            yield line.rstrip()
+            yield [line.rstrip()]
     else:
-        yield from sys.stdin
+        # read what is available (up to READ_SIZE bytes) without waiting 
+        # for more, carrying the incomplete last line over:
+        read1 = sys.stdin.buffer.read1
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(sys.stdin.encoding)(sys.stdin.errors),
+            translate=True,
+        )
+        tail = ""
+        while block := read1(READ_SIZE):
+            lines = (tail + decoder.decode(block)).split("\n")
+            tail = lines.pop()
+            for start in range(0, len(lines), batch_size):
+                yield lines[start:start + batch_size]
+        lines = (tail + decoder.decode(b"", final=True)).split("\n")
+        if not lines[-1]:
+            lines.pop()
+        if lines:
+            yield lines
+
+
+def throttled(batches, in_flight):
+    """
+    Iterate over `batches`, waiting for the `in_flight` semaphore before 
+    each one, so that the pool only reads input as fast as it is written. 
+    """
+    for batch in batches:
+        in_flight.acquire()
+        yield batch
 
 
-def consume(iterator, n=None):
-    """
-    Advance the iterator n-steps ahead. If n is None, consume entirely.
+# batch processors, one per (source_format, target_format), so that no
+# format is checked per line; lines go through the cached `syllabify`:
+def ipa_to_ipa(lines):
+    return [str(syllabification)
+            for syllabification in map(sylfr.syllabify, lines)]
 
-    Reference
-    ---------
-    https://docs.python.org/3.9/library/itertools.html
-    """
-    # Use functions that consume iterators at C speed.
-    if n is None:
-        # feed the entire iterator into a zero-length deque
-        collections.deque(iterator, maxlen=0)
-    else:
-        # advance to the empty slice starting at position n
-        next(islice(iterator, n, n), None)
 
+def ipa_to_xsampa(lines):
+    return [xsampa(str(syllabification))
+            for syllabification in map(sylfr.syllabify, lines)]
 
-def callback(*, source_format, target_format):
-    stream: Iterator[str] = iter_stdin()
 
-    if source_format == "xsampa":
-        stream = map(ipa, stream)
-    elif source_format == "ipa":
-        pass
-    else:
-        raise NotImplementedError(f"{source_format=}")
+def xsampa_to_ipa(lines):
+    return [str(syllabification)
+            for syllabification in map(sylfr.syllabify, map(ipa, lines))]
 
-    stream: Iterator[sylfr.Syllabification] = map(sylfr.syllabify, stream)
-    stream: Iterator[str] = map(str, stream)
 
-    if target_format == "ipa":
-        pass
-    elif target_format == "xsampa":
-        stream = map(xsampa, stream)
-    else:
-        raise NotImplementedError(f"{target_format=}")
+def xsampa_to_xsampa(lines):
+    return [xsampa(str(syllabification))
+            for syllabification in map(sylfr.syllabify, map(ipa, lines))]
+
+
+PROCESSORS = {
+    ("ipa", "ipa"): ipa_to_ipa,
+    ("ipa", "xsampa"): ipa_to_xsampa,
+    ("xsampa", "ipa"): xsampa_to_ipa,
+    ("xsampa", "xsampa"): xsampa_to_xsampa,
+}
 
-    stream = map(print, stream)
-    consume(stream)
+
+def callback(*, source_format, target_format, jobs):
+    r"""
+    Syllabify the standard input line by line. 
+
+    Examples
+    --------
+    ~~~python
+    >>> import io, contextlib
+    >>> from unittest import mock
+    >>> def run(text, **kwargs):
+    ...     stdin = io.TextIOWrapper(io.BytesIO(text.encode()), encoding="utf-8")
+    ...     stdout = io.StringIO()
+    ...     with mock.patch("sys.stdin", stdin), contextlib.redirect_stdout(stdout):
+    ...         callback(source_format="ipa", target_format="ipa", **kwargs)
+    ...     return stdout.getvalue()
+    >>> lines = ["kadavʁ", "stʁiktəmɑ̃", "aʁbʁ", "spɔʁ", "kɑ̃bʁje"] * 1000
+    >>> expected = "".join(str(sylfr.syllabify(line)) + "\n" for line in lines)
+    >>> run("\n".join(lines), jobs=1) == expected
+    True
+    >>> run("\n".join(lines), jobs=2) == expected
+    True
+
+    ~~~
+    """
+    try:
+        process = PROCESSORS[source_format, target_format]
+    except KeyError:
+        raise NotImplementedError(f"{source_format=}, {target_format=}") from None
+
+    batches: Iterator[List[str]] = iter_stdin(BATCH_SIZE)
+    if sys.stdin.isatty():
+        # interactive lines come one at a time:
+        jobs = 1
+
+    write = sys.stdout.write
+    with contextlib.ExitStack() as stack:
+        if jobs > 1:
+            # batches are independent, `imap` keeps them in order; at most 
+            # `window` batches are read but not written yet:
+            window = 2 * jobs
+            in_flight = threading.Semaphore(window)
+            pool = stack.enter_context(multiprocessing.Pool(jobs))
+            # do not leave the pool feeder waiting when stopping early:
+            stack.callback(in_flight.release, window)
+            outputs: Iterator[List[str]] = pool.imap(
+                process, throttled(batches, in_flight))
+            written = in_flight.release
+        else:
+            outputs: Iterator[List[str]] = map(process, batches)
+            written = lambda: None
+        # one write per batch instead of one per line:
+        for output in outputs:
+            written()
+            output.append("")
+            write("\n".join(output))
+
+
+def positive_int(value):
+    """
+    Argument type for integers greater than or equal to 1. 
+
+    Examples
+    --------
+    ~~~python
+    >>> positive_int("2")
+    2
+    >>> positive_int("0")
+    Traceback (most recent call last):
+    ...
+    argparse.ArgumentTypeError: doit être supérieur ou égal à 1: '0'
+
+    ~~~
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            f"doit être supérieur ou égal à 1: {value!r}")
+    return number
 
 
 def ArgumentParser():
@@ -79,6 +186,13 @@ def ArgumentParser():
         default="ipa",
         help="Format de sortie.  'ipa' par défaut. "
     )
+    parser.add_argument(
+        "-j", "--jobs",
+        dest="jobs",
+        type=positive_int,
+        default=1,
+        help="Nombre de processus pour une entrée non interactive.  1 par défaut. ",
+    )
     parser.set_defaults(__callback__=callback)
     return parser
 